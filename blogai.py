@@ -1,22 +1,27 @@
 # Import necessary libraries
 import streamlit as st  # For creating the web app interface
 import os  # For accessing environment variables
+import json  # For writing and reading batch request files
+import hashlib  # For keying the response cache by prompt
+import shelve  # For keeping the response cache on disk
+import time  # For waiting between batch job status checks
+import tempfile  # For the batch request file
+import asyncio  # For generating several blog posts at once
+import datetime  # For how long cached blog posts are kept
+import threading  # For guarding caches shared between sessions
+from collections import OrderedDict  # For least-recently-used eviction in the semantic cache
+import numpy as np  # For comparing topic embeddings
+import ahocorasick  # For finding tone keywords in a topic in one pass
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception  # For retrying failed Gemini calls
 import google.generativeai as genai  # Google's Gemini AI API
+from google.api_core import exceptions as google_exceptions  # Errors raised by Google APIs
+from google.auth import exceptions as google_auth_exceptions  # Errors for missing or bad credentials
+from google import genai as genai_sdk  # Newer Gemini SDK (Batch API and service tiers)
+from google.genai import errors as genai_errors  # Errors raised by the newer google-genai SDK
 from dotenv import load_dotenv  # For loading environment variables from .env file
 
-# Load environment variables from .env file (for local development)
-# This is where you'd store sensitive information like API keys
-load_dotenv()
-
-# Try to use the API key from Streamlit secrets (for deployment on Streamlit Cloud)
-try:
-    api_key = st.secrets["GEMINI_API_KEY"]
-except Exception:
-    # If not found in Streamlit secrets, fall back to the environment variable (for local development)
-    api_key = os.environ.get("GEMINI_API_KEY")
-
-# Configure the Gemini API with the obtained API key
-genai.configure(api_key=api_key)
+# Which Gemini model to use
+model_name = "gemini-1.5-flash-8b"
 
 # Define generation settings for the AI model
 # These parameters control how the AI generates text
@@ -24,23 +29,375 @@ generation_config = {
     "temperature": 1,  # Controls randomness (0 = deterministic, 1 = more creative)
     "top_p": 0.95,  # Controls diversity of responses (nucleus sampling)
     "top_k": 40,  # Limits the next word selection to top K candidates
-    "max_output_tokens": 8192,  # Maximum length of the response
+    "max_output_tokens": 8192,  # Maximum length of the response (lowered per request to fit the word count)
     "response_mime_type": "text/plain",  # Format of the response
 }
 
-# Initialize the generative model from Gemini API
-model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash-8b",  # Specifies which Gemini model to use
-    generation_config=generation_config,  # Applies our configuration
-    system_instruction="""
-    You are a professional writer and blogger with expertise in crafting engaging, well-structured blog posts.
-    Generate a blog post based on the given topic, tone, and word count.
-    The tone should align with the user's selection (e.g., professional, humorous, casual, or a mix).
-    Ensure the blog follows a proper structure, including an introduction, body sections, and a conclusion.
-    Keep the writing engaging, informative, and suitable for a general audience.
-    """,  # This instruction tells the AI how to behave
+# This instruction tells the AI how to behave
+system_instruction = """
+You are a professional writer and blogger with expertise in crafting engaging, well-structured blog posts.
+Generate a blog post based on the given topic, tone, and word count.
+The tone should align with the user's selection (e.g., professional, humorous, casual, or a mix).
+Ensure the blog follows a proper structure, including an introduction, body sections, and a conclusion.
+Keep the writing engaging, informative, and suitable for a general audience.
+"""
+
+def get_api_key():
+    """
+    Looks up the Gemini API key from Streamlit secrets or the environment.
+
+    Returns:
+        The API key, or None if it isn't set
+    """
+    # Load environment variables from .env file (for local development)
+    # This is where you'd store sensitive information like API keys
+    load_dotenv()
+
+    # Try to use the API key from Streamlit secrets (for deployment on Streamlit Cloud)
+    try:
+        return st.secrets["GEMINI_API_KEY"]
+    except Exception:
+        # If not found in Streamlit secrets, fall back to the environment variable (for local development)
+        return os.environ.get("GEMINI_API_KEY")
+
+# Build the Gemini model only once per process
+# Streamlit re-runs this whole script on every widget interaction, so caching
+# the model avoids re-configuring the SDK and rebuilding the client each time
+@st.cache_resource
+def get_model():
+    """
+    Configures the Gemini API and creates the generative model.
+
+    Returns:
+        The initialized Gemini GenerativeModel
+    """
+    # Configure the Gemini API with the obtained API key
+    genai.configure(api_key=get_api_key())
+
+    # Initialize the generative model from Gemini API
+    return genai.GenerativeModel(
+        model_name=model_name,  # Specifies which Gemini model to use
+        generation_config=generation_config,  # Applies our configuration
+        system_instruction=system_instruction,  # Tells the AI how to behave
+    )
+
+def build_prompt(topic, tone, length):
+    """
+    Creates the detailed prompt sent to the AI for one blog post.
+
+    Args:
+        topic: The blog topic
+        tone: The writing style to use
+        length: Maximum word count
+
+    Returns:
+        The prompt text
+    """
+    return (
+        f"Write a {tone.lower()} blog post about '{topic}' with a maximum of {length} words. "
+        "Ensure a proper structure including an introduction, main sections, and a conclusion."
+    )
+
+def output_token_limit(length):
+    """
+    Works out how many tokens the AI may generate for a post of the given word count.
+    A word is about 1.33 tokens, so this leaves some headroom without allowing far
+    more output than was asked for.
+
+    Args:
+        length: Maximum word count
+
+    Returns:
+        The max_output_tokens value for the request
+    """
+    return int(length * 1.6) + 64
+
+# Client for the newer google-genai SDK, which has the Batch API and service tiers
+@st.cache_resource
+def get_genai_client():
+    """
+    Creates the google-genai client used for batch jobs and non-standard service tiers.
+
+    Returns:
+        The initialized google-genai Client
+    """
+    return genai_sdk.Client(api_key=get_api_key())
+
+def response_text(response):
+    """
+    Returns the text in a Gemini response (or streamed chunk), or "" if it has none.
+    Reading response.text directly raises an error when there are no parts, which
+    happens on the last chunk of a stream and when generation stops early.
+    """
+    if not response.candidates:
+        return ""
+    content = response.candidates[0].content
+    if not content or not content.parts:
+        return ""
+    return "".join(part.text or "" for part in content.parts)
+
+def finish_reason(response):
+    """Returns why Gemini stopped generating (e.g. "STOP" or "MAX_TOKENS"), or None if it hasn't yet."""
+    if not response.candidates:
+        return None
+    reason = getattr(response.candidates[0].finish_reason, "name", None)
+    return None if reason in (None, "FINISH_REASON_UNSPECIFIED") else reason
+
+def process_gemini_batch(posts, poll_interval=60):
+    """
+    Generates many blog posts in one go using the Gemini Batch API.
+    Batch jobs cost half as much as normal calls but can take up to 24 hours,
+    so this is meant for bulk/offline use rather than the interactive app.
+
+    Args:
+        posts: List of (topic, tone, length) tuples
+        poll_interval: Seconds to wait between checks on the job
+
+    Returns:
+        Dictionary mapping each post's key ("post-0", "post-1", ...) to its text
+    """
+    client = get_genai_client()
+
+    # Write one request per line to a JSONL file
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", delete=False) as batch_file:
+        for i, (topic, tone, length) in enumerate(posts):
+            request = {
+                "contents": [{"parts": [{"text": build_prompt(topic, tone, length)}]}],
+                "system_instruction": {"parts": [{"text": system_instruction}]},
+                "generation_config": {**generation_config, "max_output_tokens": output_token_limit(length)},
+            }
+            batch_file.write(json.dumps({"key": f"post-{i}", "request": request}) + "\n")
+
+    # Upload the requests and start the batch job
+    try:
+        uploaded_file = client.files.upload(
+            file=batch_file.name,
+            config={"display_name": "blogai-batch", "mime_type": "jsonl"},
+        )
+    finally:
+        os.remove(batch_file.name)
+    batch_job = client.batches.create(
+        model=model_name,
+        src=uploaded_file.name,
+        config={"display_name": "blogai-batch"},
+    )
+
+    # Wait for the job to finish
+    finished_states = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+    while batch_job.state.name not in finished_states:
+        time.sleep(poll_interval)
+        batch_job = client.batches.get(name=batch_job.name)
+
+    if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+        raise RuntimeError(f"Batch job {batch_job.name} finished with state {batch_job.state.name}")
+
+    # Download the results (also one JSON object per line) and pull out each post's text
+    results = client.files.download(file=batch_job.dest.file_name).decode("utf-8")
+    blog_posts = {}
+    for line in results.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+
+        # A failed or blocked request (no response or candidates) or one cut off with no
+        # parts has no text; leave it out rather than failing the whole batch
+        candidates = result.get("response", {}).get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        text = "".join(part.get("text", "") for part in parts)
+        if text:
+            blog_posts[result["key"]] = text
+
+    return blog_posts
+
+# HTTP status codes for errors that are worth retrying
+# 429 = rate limited, 500 = server error, 503 = overloaded (common on the flex tier)
+temporary_error_codes = {429, 500, 503}
+
+def is_temporary_error(error):
+    """Returns True if a Gemini error is temporary (both Google SDKs put the HTTP status in error.code)."""
+    return getattr(error, "code", None) in temporary_error_codes
+
+# Retry Gemini calls that fail for temporary reasons (rate limits, overloaded servers),
+# waiting a random, growing amount of time between attempts so retries don't pile up
+retry_gemini = retry(
+    stop=stop_after_attempt(4),
+    wait=wait_random_exponential(min=1, max=16),
+    retry=retry_if_exception(is_temporary_error),
+    reraise=True,  # After the last attempt, raise the original error
 )
 
+# Limit how many blog posts the app generates at once across all sessions,
+# so busy periods queue up instead of all hitting Gemini's rate limit.
+# Each service tier gets its own limit (Streamlit caches one semaphore per tier),
+# so slow flex requests never hold up standard ones.
+@st.cache_resource
+def get_gemini_semaphore(service_tier=None):
+    """
+    Returns the semaphore limiting concurrent generations for a service tier.
+
+    Args:
+        service_tier: Gemini service tier (e.g. "flex"), or None for the standard tier
+
+    Returns:
+        A threading.Semaphore shared by every session in the process
+    """
+    return threading.Semaphore(4)
+
+async def process_gemini_many(topics, tone, length, max_concurrent=8):
+    """
+    Generates a blog post for each topic at the same time using the async Gemini API.
+
+    Args:
+        topics: List of blog topics
+        tone: The writing style to use for every post
+        length: Maximum word count for every post
+        max_concurrent: How many requests may be in flight at once (keeps us under rate limits)
+
+    Returns:
+        List of blog post texts, in the same order as the topics
+    """
+    model = get_model()
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    # The slot is taken inside the retried function, so a request waiting
+    # to retry doesn't keep other requests from running
+    @retry_gemini
+    async def gen_one(topic):
+        async with semaphore:
+            response = await model.generate_content_async(
+                build_prompt(topic, tone, length),
+                generation_config={"max_output_tokens": output_token_limit(length)},
+            )
+        return response_text(response)
+
+    # Send all the requests concurrently and wait for them all to finish
+    return await asyncio.gather(*(gen_one(topic) for topic in topics))
+
+class SemanticCache:
+    """
+    Remembers generated blog posts by the meaning of their topic, so a near-duplicate
+    topic (e.g. "AI in healthcare" vs "AI for healthcare") can reuse an earlier post.
+    Topics are compared by the cosine similarity of their Gemini embeddings.
+    """
+
+    def __init__(self, threshold=0.92, max_entries=500):
+        self.threshold = threshold  # How similar two topics must be to count as the same
+        self.max_entries = max_entries  # Oldest (least recently used) posts are dropped past this
+        self.entries = OrderedDict()  # (topic, tone, length) -> (unit-length embedding, blog post)
+        self.lock = threading.Lock()  # The cache is shared by every session in the process
+
+    def embed(self, topic):
+        """
+        Returns the topic's embedding, scaled to unit length.
+        Not retried: the semantic cache is optional, so callers skip it if this fails.
+        """
+        result = genai.embed_content(model="models/text-embedding-004", content=topic)
+        embedding = np.asarray(result["embedding"], dtype=np.float32)
+        return embedding / np.linalg.norm(embedding)
+
+    def lookup(self, embedding, tone, length):
+        """Returns the cached post for the most similar topic with the same tone and length, or None."""
+        with self.lock:
+            keys = [key for key in self.entries if key[1] == tone and key[2] == length]
+            if not keys:
+                return None
+
+            # Embeddings are unit length, so the dot product is the cosine similarity
+            similarities = np.stack([self.entries[key][0] for key in keys]) @ embedding
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            self.entries.move_to_end(keys[best])
+            return self.entries[keys[best]][1]
+
+    def add(self, topic, tone, length, embedding, blog_post):
+        """Stores a generated post, dropping the least recently used one if the cache is full."""
+        with self.lock:
+            self.entries[(topic, tone, length)] = (embedding, blog_post)
+            self.entries.move_to_end((topic, tone, length))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """Forgets every cached post."""
+        with self.lock:
+            self.entries.clear()
+
+# One semantic cache shared across reruns and sessions
+@st.cache_resource
+def get_semantic_cache():
+    """Returns the process-wide SemanticCache."""
+    return SemanticCache()
+
+class ResponseCache:
+    """
+    Remembers finished blog posts by their exact prompt, so the same topic, tone and
+    length don't call Gemini again. Posts are stored on disk under a hash of the
+    prompt, so the cache survives app restarts and redeploys.
+    """
+
+    def __init__(self, path, max_entries=512, max_age=datetime.timedelta(days=7)):
+        self.max_entries = max_entries  # Oldest (least recently used) posts are dropped past this
+        self.max_age = max_age.total_seconds()  # Posts older than this are generated again
+        self.lock = threading.Lock()  # The cache is shared by every session in the process
+
+        # sha256 of the prompt -> (time it was saved, blog post)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.entries = shelve.open(path)
+        # Keys from least to most recently used (starting from when each post was saved)
+        self.order = OrderedDict(
+            (key, None) for key in sorted(self.entries.keys(), key=lambda key: self.entries[key][0])
+        )
+
+    def key(self, prompt):
+        """Returns the cache key for a prompt."""
+        return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+    def get(self, prompt):
+        """Returns the cached post for the prompt, or None."""
+        with self.lock:
+            key = self.key(prompt)
+            if key not in self.order:
+                return None
+
+            saved_at, blog_post = self.entries[key]
+            if time.time() - saved_at > self.max_age:
+                # Too old; forget it so a fresh post is generated
+                del self.entries[key]
+                del self.order[key]
+                self.entries.sync()
+                return None
+
+            self.order.move_to_end(key)
+            return blog_post
+
+    def add(self, prompt, blog_post):
+        """Stores a generated post, dropping the least recently used one if the cache is full."""
+        with self.lock:
+            key = self.key(prompt)
+            self.entries[key] = (time.time(), blog_post)
+            self.order[key] = None
+            self.order.move_to_end(key)
+            while len(self.order) > self.max_entries:
+                oldest, _ = self.order.popitem(last=False)
+                del self.entries[oldest]
+            self.entries.sync()
+
+    def clear(self):
+        """Forgets every cached post."""
+        with self.lock:
+            self.entries.clear()
+            self.order.clear()
+            self.entries.sync()
+
+# One response cache shared across reruns and sessions
+# Kept next to Streamlit's own cache files in ~/.streamlit/cache
+@st.cache_resource
+def get_response_cache():
+    """Returns the process-wide ResponseCache."""
+    return ResponseCache(os.path.join(os.path.expanduser("~"), ".streamlit", "cache", "blogai_responses"))
+
 # =============================================
 # Streamlit User Interface Setup
 # =============================================
@@ -64,37 +421,63 @@ tone_options = {
     "Thought-Provoking & Philosophical": "Encourages deep thinking and reflection."
 }
 
+# Tone names in display order, and each tone's position in that list (used by the dropdown)
+tone_names = tuple(tone_options.keys())
+tone_index = {tone: i for i, tone in enumerate(tone_names)}
+
+# Keywords that hint at each tone
+tone_keywords = {
+    "Professional": ["business", "finance", "corporate", "strategy"],
+    "Informative & Educational": ["science", "education", "learning", "technology"],
+    "Conversational & Friendly": ["personal", "lifestyle", "travel", "relationships"],
+    "Witty & Humorous": ["comedy", "entertainment", "jokes"],
+    "Persuasive & Sales-Oriented": ["marketing", "sales", "advertising", "branding"],
+    "Inspirational & Motivational": ["motivation", "success", "self-improvement", "inspiration"],
+    "Narrative & Storytelling": ["history", "biography", "stories", "fiction"],
+    "Analytical & Data-Driven": ["data", "analysis", "research", "statistics"],
+    "Casual & Fun": ["fun", "casual", "easy", "relaxed"],
+    "Thought-Provoking & Philosophical": ["philosophy", "deep", "thoughts", "ethics"],
+}
+# Compile the keywords only once per process into an Aho-Corasick automaton,
+# which finds every keyword in a single pass over the topic no matter how many there are
+@st.cache_resource
+def get_tone_automaton():
+    """
+    Builds the automaton used to find tone keywords in a topic.
+
+    Returns:
+        An ahocorasick.Automaton mapping each keyword to (keyword, tone)
+    """
+    automaton = ahocorasick.Automaton()
+    for tone, words in tone_keywords.items():
+        for word in words:
+            automaton.add_word(word, (word, tone))
+    automaton.make_automaton()
+    return automaton
+
+def is_word_char(char):
+    """Returns True if the character is part of a word (letters and digits)."""
+    return char.isalnum()
+
 # Function to suggest a tone based on the topic
+# Cached with st.cache_data because Streamlit calls it again with the same topic on every
+# rerun (a plain lru_cache wouldn't help: the whole script, and so the function, is redefined each time)
+@st.cache_data(show_spinner=False, max_entries=256)
 def suggest_tone(topic):
     """
     Analyzes the topic and suggests an appropriate writing tone.
     Looks for keywords in the topic to determine the best tone.
     """
     topic_lower = topic.lower()  # Convert to lowercase for case-insensitive comparison
-    
-    # Check for keywords and return matching tone
-    if any(word in topic_lower for word in ["business", "finance", "corporate", "strategy"]):
-        return "Professional"
-    elif any(word in topic_lower for word in ["science", "education", "learning", "technology"]):
-        return "Informative & Educational"
-    elif any(word in topic_lower for word in ["personal", "lifestyle", "travel", "relationships"]):
-        return "Conversational & Friendly"
-    elif any(word in topic_lower for word in ["comedy", "fun", "entertainment", "jokes"]):
-        return "Witty & Humorous"
-    elif any(word in topic_lower for word in ["marketing", "sales", "advertising", "branding"]):
-        return "Persuasive & Sales-Oriented"
-    elif any(word in topic_lower for word in ["motivation", "success", "self-improvement", "inspiration"]):
-        return "Inspirational & Motivational"
-    elif any(word in topic_lower for word in ["history", "biography", "stories", "fiction"]):
-        return "Narrative & Storytelling"
-    elif any(word in topic_lower for word in ["data", "analysis", "research", "statistics"]):
-        return "Analytical & Data-Driven"
-    elif any(word in topic_lower for word in ["fun", "casual", "easy", "relaxed"]):
-        return "Casual & Fun"
-    elif any(word in topic_lower for word in ["philosophy", "deep", "thoughts", "ethics"]):
-        return "Thought-Provoking & Philosophical"
-    else:
-        return "Professional"  # Default tone if no keywords match
+
+    # Return the tone of the first keyword found at the start of a word, so other forms of
+    # the word still match ("motivational", "sciences") but not words ending in it ("refund")
+    for end, (word, tone) in get_tone_automaton().iter(topic_lower):
+        start = end - len(word) + 1
+        if start == 0 or not is_word_char(topic_lower[start - 1]):
+            return tone
+
+    return "Professional"  # Default tone if no keywords match
 
 # =============================================
 # User Input Section
@@ -115,8 +498,8 @@ else:
 # Dropdown for tone selection (defaults to the suggested tone)
 selected_tone = st.selectbox(
     "Choose the tone for your blog:", 
-    list(tone_options.keys()),  # All available tone options
-    index=list(tone_options.keys()).index(suggested_tone)  # Default selection
+    tone_names,  # All available tone options
+    index=tone_index[suggested_tone]  # Default selection
 )
 
 # Display the selected tone's description
@@ -131,41 +514,144 @@ length_option = st.slider(
     step=100  # Increment step
 )
 
+# Checkbox for the cheaper "flex" service tier
+# Flex requests cost half as much but Gemini may take minutes to answer them
+not_in_a_hurry = st.checkbox("I'm not in a hurry (50% cheaper)")
+service_tier = "flex" if not_in_a_hurry else None  # None = the standard tier
+
 # =============================================
 # Blog Post Generation Section
 # =============================================
 
+# Get the (cached) model for this run
+model = get_model()
+
 # Only generate if a topic is provided
 if topic:
-    # Show what we're about to generate
-    st.write(f"Generating a **{selected_tone.lower()}** blog post about **{topic}** with up to {length_option} words...")
-
-    def process_gemini_response(prompt, tone, length):
+    # Temporary Gemini errors are retried (see retry_gemini) instead of losing the post.
+    # The caller checks the response cache first, so this always calls Gemini.
+    @retry_gemini
+    def process_gemini_response(modified_prompt, length, placeholder, service_tier=None):
         """
-        Generates a blog post using the Gemini API.
+        Generates a blog post using the Gemini API, streaming it as it's written.
         
         Args:
-            prompt: The blog topic
-            tone: The writing style to use
+            modified_prompt: The full prompt for the post (see build_prompt)
             length: Maximum word count
+            placeholder: Streamlit container to stream the text into
+            service_tier: Gemini service tier to use (e.g. "flex"), or None for the standard tier
             
         Returns:
-            The generated blog post text
+            The generated blog post text, and whether Gemini finished it normally
+            (False if it was cut off, e.g. by the output token limit)
         """
-        # Create a detailed prompt for the AI
-        modified_prompt = (
-            f"Write a {tone.lower()} blog post about '{prompt}' with a maximum of {length} words. "
-            "Ensure a proper structure including an introduction, main sections, and a conclusion."
-        )
+        # Wait for a free slot if too many posts are already being generated
+        with get_gemini_semaphore(service_tier):
+            # Send our prompt and get the response back in chunks as it's generated
+            # (a single generate_content call, since there's no conversation to keep)
+            # Output is capped to roughly the requested length instead of the model-wide 8192 tokens
+            if service_tier:
+                # Service tiers are only available through the newer google-genai SDK
+                stream = get_genai_client().models.generate_content_stream(
+                    model=model_name,
+                    contents=modified_prompt,
+                    config={
+                        **generation_config,
+                        "max_output_tokens": output_token_limit(length),
+                        "system_instruction": system_instruction,
+                        "service_tier": service_tier,
+                    },
+                )
+            else:
+                stream = model.generate_content(
+                    modified_prompt,
+                    generation_config={"max_output_tokens": output_token_limit(length)},
+                    stream=True,
+                )
+
+            # Show the words as they arrive and collect the full text for the cache
+            # While streaming, the text is shown as plain (unrendered) markdown so headings
+            # and lists don't jump around on every chunk; it's rendered once at the end
+            parts = []
+            reason = None
+            for chunk in stream:
+                text = response_text(chunk)  # Some chunks (e.g. the last one) carry no text
+                if text:
+                    parts.append(text)
+                    placeholder.code("".join(parts), language="markdown")
+                reason = finish_reason(chunk) or reason
+
+            blog_post = "".join(parts)
+            placeholder.markdown(blog_post)
+            return blog_post, reason == "STOP"
+
+    # The topic, tone and length the user is currently asking for
+    current_request = (topic, selected_tone, length_option)
+
+    def regenerate_blog_post():
+        """Makes the next generation skip the caches and ask Gemini for a fresh post."""
+        st.session_state["regenerate"] = True
+
+    # Only call Gemini when the user asks for it, not on every slider or dropdown change
+    generate = st.button("Generate")
+
+    # Set by the Regenerate button (shown under the post) before this rerun started
+    regenerate = st.session_state.pop("regenerate", False)
+
+    if generate or regenerate:
+        # Show what we're about to generate
+        st.write(f"Generating a **{selected_tone.lower()}** blog post about **{topic}** with up to {length_option} words...")
+
+    # Space on the page where the blog post will appear
+    placeholder = st.empty()
+
+    if generate or regenerate:
+        # Regenerate skips the lookups; the fresh post then replaces the cached one for this request
+        blog_post = None
+
+        # Reuse a post for exactly the same prompt if we've already written one
+        modified_prompt = build_prompt(topic, selected_tone, length_option)
+        response_cache = get_response_cache()
+        if not regenerate:
+            blog_post = response_cache.get(modified_prompt)
+
+        # Otherwise reuse a post for a very similar topic (only embedding the topic when we need to)
+        semantic_cache = get_semantic_cache()
+        topic_embedding = None
+        if blog_post is None:
+            try:
+                topic_embedding = semantic_cache.embed(topic)
+            except (google_exceptions.GoogleAPICallError, google_auth_exceptions.GoogleAuthError):
+                # The embedding is only an optimization; if it fails, just skip the semantic cache
+                pass
+
+        if topic_embedding is not None and not regenerate:
+            blog_post = semantic_cache.lookup(topic_embedding, selected_tone, length_option)
+
+        if blog_post is None:
+            # Generate the blog post using our function
+            try:
+                blog_post, finished = process_gemini_response(modified_prompt, length_option, placeholder, service_tier)
+            except (google_exceptions.GoogleAPICallError, genai_errors.APIError, google_auth_exceptions.GoogleAuthError) as error:
+                # Out of retries, or an error that retrying won't fix: tell the user instead of crashing
+                st.session_state.pop("blog_post", None)
+                placeholder.error(f"Sorry, the blog post couldn't be generated ({error}). Please try again.")
+            else:
+                # Only reuse posts Gemini finished properly, not ones that were cut off
+                if finished:
+                    response_cache.add(modified_prompt, blog_post)
+                    if topic_embedding is not None:
+                        semantic_cache.add(topic, selected_tone, length_option, topic_embedding, blog_post)
 
-        # Start a chat session with the model
-        chat_session = model.start_chat()
-        # Send our prompt and get the response
-        response = chat_session.send_message(modified_prompt)
-        return response.text
+        # Kept in session state (with what it was written for) so it stays on screen across later reruns
+        if blog_post is not None:
+            st.session_state["blog_post"] = {"request": current_request, "text": blog_post}
 
-    # Generate the blog post using our function
-    blog_post = process_gemini_response(topic, selected_tone, length_option)
+    # Display the generated blog post (also covers cached posts that weren't streamed),
+    # but only while the inputs still match the ones it was written for
+    stored_post = st.session_state.get("blog_post")
+    if stored_post and stored_post["request"] == current_request:
+        placeholder.markdown(stored_post["text"])
 
-    # Display the generated blog post
-    st.write(blog_post)
\ No newline at end of file
+        # Let the user ask Gemini for a fresh draft instead of the cached one
+        st.button("Regenerate", on_click=regenerate_blog_post)